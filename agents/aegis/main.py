@@ -1,5 +1,5 @@
 import os
-from flask import Flask, jsonify
+from flask import Flask, request, jsonify
 from shared import log, new_request_id, draft_text, send_email, get_backnine_quote, make_sheets_client
 
 app = Flask(__name__)
@@ -1,6 +1,7 @@
 import os
+import json
 from flask import Flask, request, jsonify
-from shared import log, new_request_id, draft_text, send_email
+from shared import log, new_request_id, draft_structured, structured_stats, new_run_stats, send_email
 
 app = Flask(__name__)
 
@@ -28,6 +29,7 @@ def handle_generate():
 
     req_id = new_request_id()
     log("Architect agent run started.", request_id=req_id)
+    run_stats = new_run_stats()
 
     try:
         # --- 1. Get Input Data (Stubbed) ---
@@ -38,7 +40,7 @@ def handle_generate():
         for loc in locations:
             # --- 2. Generate Landing Page Content ---
             log(f"Generating content for {loc['name']}...", request_id=req_id)
-            page_content = _generate_landing_page_content(loc, req_id)
+            page_content = _generate_landing_page_content(loc, req_id, run_stats)
 
             # --- 3. Commit to GitHub ---
             commit_info = _commit_to_github(page_content, loc, req_id)
@@ -54,16 +56,44 @@ def handle_generate():
         send_email(subject=email_subject, content=email_content)
         log("Sent summary email.", request_id=req_id)
 
+        llm_stats = structured_stats(run_stats)
+        log(f"Structured output stats: {llm_stats}", request_id=req_id)
+
         return jsonify({
             "status": "ok",
             "message": "Architect agent run completed.",
-            "results": results
+            "results": results,
+            "llm_stats": llm_stats,
         }), 200
 
     except Exception as e:
         log(f"FATAL (architect-agent): {e}", request_id=req_id)
         return jsonify({"error": "Internal server error"}), 500
 
+# ---- Landing page schema ----
+LANDING_PAGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "headline": {"type": "string", "minLength": 5},
+        "intro": {"type": "string", "minLength": 20},
+        "sections": {
+            "type": "array",
+            "minItems": 3,
+            "maxItems": 3,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "heading": {"type": "string", "minLength": 3},
+                    "text": {"type": "string", "minLength": 20},
+                },
+                "required": ["heading", "text"],
+            },
+        },
+        "cta": {"type": "string", "minLength": 3},
+    },
+    "required": ["headline", "intro", "sections", "cta"],
+}
+
 # ---- Helper Functions ----
 def _get_locations_stub():
     """Returns a stubbed list of locations."""
@@ -72,8 +102,11 @@ def _get_locations_stub():
         {"name": "New York", "zip": "10001", "state_code": "NY"},
     ]
 
-def _generate_landing_page_content(location: dict, req_id: str) -> str:
-    """Generates React component text for a landing page using the LLM."""
+def _generate_landing_page_content(location: dict, req_id: str, run_stats: dict | None = None) -> str:
+    """
+    Generates landing page data using the LLM, validated against LANDING_PAGE_SCHEMA.
+    Returns a JSON object literal safe to embed in the .tsx file.
+    """
     log(f"Generating landing page content for {location['name']}...", request_id=req_id)
 
     system_prompt = "You are an expert web developer and copywriter. You will be given a location and asked to create the text content for a React landing page component for a life insurance website. The output should be only the text content, formatted cleanly."
@@ -90,8 +123,8 @@ The content should include:
 Please format the output as a simple JSON object with keys: "headline", "intro", "sections" (an array of {{"heading": "...", "text": "..."}}), and "cta".
 """
 
-    content = draft_text(prompt=user_prompt, system=system_prompt)
-    return content
+    data = draft_structured(prompt=user_prompt, schema=LANDING_PAGE_SCHEMA, system=system_prompt, request_id=req_id, stats=run_stats)
+    return json.dumps(data, indent=4, ensure_ascii=False)
 
 def _commit_to_github(content: str, location: dict, req_id: str) -> dict:
     """Commits the generated content to a new branch in the GitHub repo."""
@@ -0,0 +1,92 @@
+"""
+Benchmark: rank a national ZCTA table for targeting.
+
+Synthesizes a table the size of the 2020 Census ZCTA list (33,791 rows), then times
+CSV load, cached (memory-mapped) load, and vectorized filter + score + top-k against
+the equivalent loop over a list of dicts.
+
+    PYTHONPATH=.. python bench_demographics.py [--rows 33791] [--k 10] [--repeat 20]
+"""
+import argparse
+import csv
+import os
+import statistics
+import tempfile
+import time
+import numpy as np
+import demographics
+
+
+def synth_csv(path: str, rows: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    zips = rng.choice(np.arange(501, 99951), size=rows, replace=False)
+    income = np.clip(rng.lognormal(11.1, 0.4, rows), 15000, 250001).round()
+    household = np.clip(rng.normal(2.55, 0.45, rows), 1.0, 6.0).round(2)
+    age = np.clip(rng.normal(41, 7, rows), 18, 80).round(1)
+    population = rng.integers(50, 120000, rows)
+    with open(path, "w", newline="") as fh:
+        w = csv.writer(fh)
+        w.writerow(["zip", "median_income", "avg_household_size", "median_age", "population"])
+        for row in zip(zips, income, household, age, population):
+            w.writerow([f"{row[0]:05d}", int(row[1]), row[2], row[3], int(row[4])])
+
+
+def timed(fn, repeat: int) -> tuple[float, object]:
+    samples, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), result
+
+
+def python_baseline(records: list[dict], k: int, bounds: dict) -> list[str]:
+    """Same ranking as demographics.select_target_zips, over a list of dicts."""
+    rows = [
+        r for r in records
+        if r["median_income"] >= bounds["min_income"] and r["avg_household_size"] >= bounds["min_household_size"]
+        and bounds["min_age"] <= r["median_age"] <= bounds["max_age"]
+    ]
+    def z(values):
+        mean = statistics.fmean(values)
+        std = statistics.pstdev(values) or 1.0
+        return [(v - mean) / std for v in values]
+    w = demographics.DEFAULT_WEIGHTS
+    zi = z([r["median_income"] for r in rows])
+    zh = z([r["avg_household_size"] for r in rows])
+    za = z([-abs(r["median_age"] - demographics.DEFAULT_TARGET_AGE) for r in rows])
+    scored = sorted(zip(rows, zi, zh, za), key=lambda t: -(w["income"] * t[1] + w["household"] * t[2] + w["age"] * t[3]))
+    return [r["zip"] for r, *_ in scored[:k]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=33791)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    bounds = {"min_income": 60000, "min_household_size": 2.2, "min_age": 28, "max_age": 55}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "zcta.csv")
+        synth_csv(path, args.rows)
+
+        cold_ms, table = timed(lambda: demographics.load_table(path), 1)  # parses CSV, writes .npy cache
+        warm_ms, table = timed(lambda: demographics.load_table(path), args.repeat)  # memory-maps the cache
+        vec_ms, top = timed(lambda: demographics.select_target_zips(table, k=args.k, **bounds), args.repeat)
+
+        records = table.rows(np.arange(len(table)))
+        py_ms, py_top = timed(lambda: python_baseline(records, args.k, bounds), max(1, args.repeat // 4))
+
+        same = [r["zip"] for r in top] == py_top
+        print(f"rows={len(table)} k={args.k}")
+        print(f"load csv (cold, builds cache): {cold_ms:9.2f} ms")
+        print(f"load cached (mmap):            {warm_ms:9.2f} ms")
+        print(f"select vectorized:             {vec_ms:9.2f} ms")
+        print(f"select list-of-dicts:          {py_ms:9.2f} ms  ({py_ms / vec_ms:.1f}x slower)")
+        print(f"rankings match: {same}")
+        print("top:", ", ".join(f"{r['zip']} ({r['score']})" for r in top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Columnar demographic data for ZIP (ZCTA) targeting.
+
+A national table (~34k ZCTAs) is loaded once per process into NumPy arrays,
+one per column, so filtering, scoring and top-k selection are vectorized.
+CSV sources are parsed once and cached next to the file as .npy columns that
+later loads memory-map. Parquet is read with pyarrow when it is installed.
+
+Expected columns (case-insensitive; common Census aliases accepted):
+zip, median_income, avg_household_size, median_age, population (optional).
+"""
+import os
+import csv
+import json
+import shutil
+import threading
+import numpy as np
+from shared import log
+
+NUMERIC_COLUMNS = ("median_income", "avg_household_size", "median_age", "population")
+REQUIRED_COLUMNS = ("zip", "median_income", "avg_household_size", "median_age")
+
+ALIASES = {
+    "zip": ("zip", "zcta", "zcta5", "zip_code", "zipcode", "geoid"),
+    "median_income": ("median_income", "median_household_income", "income"),
+    "avg_household_size": ("avg_household_size", "average_household_size", "household_size"),
+    "median_age": ("median_age", "age"),
+    "population": ("population", "total_population", "pop"),
+}
+
+# Default scoring: favour higher income and larger households, and ages near
+# the prime life-insurance buying years.
+DEFAULT_WEIGHTS = {"income": 1.0, "household": 0.6, "age": 0.8}
+DEFAULT_TARGET_AGE = 38.0
+
+
+class DemographicTable:
+    """One array per column; row i of every array describes the same ZIP."""
+
+    def __init__(self, zips: np.ndarray, columns: dict[str, np.ndarray]):
+        self.zips = zips
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.zips)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def rows(self, idx) -> list[dict]:
+        """Materialize selected rows as dicts (only do this for the final few)."""
+        out = []
+        for i in np.asarray(idx).tolist():
+            row = {"zip": f"{int(self.zips[i]):05d}"}
+            for name, col in self.columns.items():
+                value = col[i]
+                if np.isnan(value):
+                    continue
+                row[name] = int(value) if name in ("median_income", "population") else round(float(value), 2)
+            out.append(row)
+        return out
+
+
+# ---- Loading ----
+def _resolve_header(header: list[str]) -> dict[str, int]:
+    lowered = {h.strip().lower(): i for i, h in enumerate(header)}
+    found = {}
+    for name, aliases in ALIASES.items():
+        for alias in aliases:
+            if alias in lowered:
+                found[name] = lowered[alias]
+                break
+    missing = [c for c in REQUIRED_COLUMNS if c not in found]
+    if missing:
+        raise ValueError(f"Demographic file is missing column(s): {missing}")
+    return found
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")  # Census suppresses some cells ("-", "N/A")
+
+
+def _parse_zip(value) -> int | None:
+    """ZIP as an int, or None if the cell is empty or not a ZIP. Accepts numbers and strings."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # numeric Parquet columns can come back as floats
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return int(value) if 0 <= value <= 99999 else None
+    if not isinstance(value, str):
+        return None
+    # GEOIDs like "8600000US07302" end in the 5-digit ZCTA
+    tail = value.strip()[-5:]
+    return int(tail) if tail.isdigit() else None
+
+
+def _read_csv(path: str) -> DemographicTable:
+    """Parse the CSV, skipping blank, short or ZIP-less rows (footers, trailing newlines)."""
+    zips, values, skipped = [], {}, 0
+    with open(path, newline="") as fh:
+        reader = csv.reader(fh)
+        index = _resolve_header(next(reader))
+        names = [name for name in NUMERIC_COLUMNS if name in index]
+        values = {name: [] for name in names}
+        width = max(index.values()) + 1
+        zip_col = index["zip"]
+        for rec in reader:
+            zip_code = _parse_zip(rec[zip_col]) if len(rec) >= width else None
+            if zip_code is None:
+                skipped += 1
+                continue
+            zips.append(zip_code)
+            for name in names:
+                values[name].append(_to_float(rec[index[name]]))
+    if skipped:
+        log(f"WARN: skipped {skipped} malformed row(s) in {path}")
+    columns = {name: np.asarray(col, dtype=np.float32) for name, col in values.items()}
+    return DemographicTable(np.asarray(zips, dtype=np.int32), columns)
+
+
+def _read_parquet(path: str) -> DemographicTable:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Reading Parquet demographic files requires pyarrow (pip install pyarrow)") from e
+    table = pq.read_table(path)
+    index = _resolve_header(table.column_names)
+    names = table.column_names
+    parsed = [_parse_zip(z) for z in table.column(names[index["zip"]]).to_pylist()]
+    keep = np.asarray([z is not None for z in parsed], dtype=bool)
+    skipped = len(parsed) - int(keep.sum())
+    if skipped:
+        log(f"WARN: skipped {skipped} row(s) with a missing or invalid ZIP in {path}")
+    zips = np.asarray([z for z in parsed if z is not None], dtype=np.int32)
+    columns = {
+        name: table.column(names[index[name]]).to_numpy(zero_copy_only=False).astype(np.float32)[keep]
+        for name in NUMERIC_COLUMNS if name in index
+    }
+    return DemographicTable(zips, columns)
+
+
+def _cache_dir(path: str) -> str:
+    return f"{path}.cols"
+
+
+def _source_stamp(path: str) -> dict:
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def _load_cache(path: str) -> DemographicTable | None:
+    """Memory-map the cached columns if the manifest matches the current source file."""
+    cache = _cache_dir(path)
+    try:
+        with open(os.path.join(cache, "manifest.json")) as fh:
+            manifest = json.load(fh)
+        if manifest.get("source") != _source_stamp(path):
+            return None
+        zips = np.load(os.path.join(cache, "zip.npy"), mmap_mode="r")
+        columns = {name: np.load(os.path.join(cache, f"{name}.npy"), mmap_mode="r") for name in manifest["columns"]}
+    except (OSError, ValueError, KeyError):
+        return None
+    if any(len(col) != manifest["rows"] for col in (zips, *columns.values())):
+        return None
+    return DemographicTable(zips, columns)
+
+
+def _write_cache(path: str, table: DemographicTable):
+    """Build the cache in a temp dir and swap it in, so stale columns never survive a rebuild."""
+    cache = _cache_dir(path)
+    tmp = f"{cache}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "zip.npy"), table.zips)
+        for name, col in table.columns.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), col)
+        with open(os.path.join(tmp, "manifest.json"), "w") as fh:
+            json.dump({"source": _source_stamp(path), "columns": list(table.columns), "rows": len(table)}, fh)
+        old = f"{cache}.old-{os.getpid()}-{threading.get_ident()}"
+        if os.path.exists(cache):
+            os.rename(cache, old)
+        os.rename(tmp, cache)
+        shutil.rmtree(old, ignore_errors=True)
+    except OSError as e:
+        shutil.rmtree(tmp, ignore_errors=True)
+        log(f"WARN: could not cache demographic columns in {cache}: {e}")
+
+
+def load_table(path: str, use_cache: bool = True) -> DemographicTable:
+    """Load a demographic CSV or Parquet file, memory-mapping cached columns when present."""
+    if use_cache:
+        cached = _load_cache(path)
+        if cached is not None:
+            return cached
+    table = _read_parquet(path) if path.lower().endswith(".parquet") else _read_csv(path)
+    if use_cache:
+        _write_cache(path, table)
+    return table
+
+
+_tables: dict[str, DemographicTable] = {}
+_tables_lock = threading.Lock()
+
+
+def get_table(path: str) -> DemographicTable:
+    """Process-wide cache so each worker loads the table once."""
+    with _tables_lock:
+        if path not in _tables:
+            _tables[path] = load_table(path)
+        return _tables[path]
+
+
+# ---- Vectorized selection ----
+def filter_mask(
+    table: DemographicTable,
+    min_income: float | None = None,
+    min_household_size: float | None = None,
+    min_age: float | None = None,
+    max_age: float | None = None,
+    min_population: float | None = None,
+) -> np.ndarray:
+    """Boolean mask of rows meeting every given bound. Rows missing a required value never match."""
+    mask = np.ones(len(table), dtype=bool)
+    for name in REQUIRED_COLUMNS[1:]:
+        mask &= ~np.isnan(table[name])
+    if min_income is not None:
+        mask &= table["median_income"] >= min_income
+    if min_household_size is not None:
+        mask &= table["avg_household_size"] >= min_household_size
+    if min_age is not None:
+        mask &= table["median_age"] >= min_age
+    if max_age is not None:
+        mask &= table["median_age"] <= max_age
+    if min_population is not None and "population" in table.columns:
+        mask &= table["population"] >= min_population
+    return mask
+
+
+def _zscore(col: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    values = np.asarray(col, dtype=np.float32)
+    sel = values[mask]
+    if sel.size == 0:
+        return np.zeros_like(values)
+    std = sel.std()
+    return (values - sel.mean()) / (std if std > 0 else 1.0)
+
+
+def score(table: DemographicTable, mask: np.ndarray, weights: dict | None = None, target_age: float = DEFAULT_TARGET_AGE) -> np.ndarray:
+    """
+    Weighted z-score per row, normalized over the rows in `mask`.
+    Higher income and household size score up; distance from `target_age` scores down.
+    """
+    w = {**DEFAULT_WEIGHTS, **(weights or {})}
+    age_fit = -np.abs(np.asarray(table["median_age"], dtype=np.float32) - target_age)
+    return (
+        w["income"] * _zscore(table["median_income"], mask)
+        + w["household"] * _zscore(table["avg_household_size"], mask)
+        + w["age"] * _zscore(age_fit, mask)
+    )
+
+
+def top_k(scores: np.ndarray, mask: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best-scoring rows in `mask`, best first. O(n) partition, then sorts only k."""
+    candidates = np.flatnonzero(mask)
+    if candidates.size == 0 or k <= 0:
+        return candidates[:0]
+    k = min(k, candidates.size)
+    cand_scores = scores[candidates]
+    part = np.argpartition(-cand_scores, k - 1)[:k]
+    best = part[np.argsort(-cand_scores[part], kind="stable")]
+    return candidates[best]
+
+
+def select_target_zips(table: DemographicTable, k: int = 10, weights: dict | None = None, target_age: float = DEFAULT_TARGET_AGE, **bounds) -> list[dict]:
+    """Filter, score and rank the table; returns the top k rows as dicts with a `score` field."""
+    mask = filter_mask(table, **bounds)
+    scores = score(table, mask, weights, target_age)
+    idx = top_k(scores, mask, k)
+    rows = table.rows(idx)
+    for row, i in zip(rows, idx.tolist()):
+        row["score"] = round(float(scores[i]), 3)
+    return rows
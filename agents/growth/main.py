@@ -1,4 +1,5 @@
 import os
+import math
 from flask import Flask, request, jsonify
 from shared import log, new_request_id, draft_text, make_docs_client, make_drive_client, send_email
 
@@ -15,6 +16,13 @@ def add_cors_headers(resp):
     resp.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
     return resp
 
+# ---- Targeting ----
+# Local CSV/Parquet ZCTA table; without it the agent falls back to the stubbed ZIPs.
+DEMOGRAPHICS_PATH = os.environ.get("DEMOGRAPHICS_PATH")
+GROWTH_TOP_ZIPS = int(os.environ.get("GROWTH_TOP_ZIPS", 10))
+TARGETING_BOUNDS = ("min_income", "min_household_size", "min_age", "max_age", "min_population")
+MAX_TOP_ZIPS = 100  # every selected ZIP goes into the LLM prompt
+
 # ---- Health Check ----
 @app.route("/healthz", methods=["GET"])
 def handle_healthz():
@@ -30,8 +38,14 @@ def handle_run():
     log("Growth agent run started.", request_id=req_id)
 
     try:
-        # --- 1. Get Demographic Data (Stubbed) ---
-        demographic_data = _get_demographic_data_stub()
+        criteria = _parse_criteria(request.get_json(silent=True))
+    except ValueError as e:
+        log(f"Rejected targeting criteria: {e}", request_id=req_id)
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # --- 1. Select Target ZIPs ---
+        demographic_data = _get_demographic_data(criteria, req_id)
         log(f"Collected data for {len(demographic_data)} ZIPs.", request_id=req_id)
 
         # --- 2. Generate Personas and Ad Copy using LLM ---
@@ -59,6 +73,52 @@ def handle_run():
         return jsonify({"error": "Internal server error"}), 500
 
 # ---- Helper Functions ----
+def _parse_criteria(body) -> dict:
+    """
+    Validates the optional JSON body. Returns {"top_k": int, "bounds": {name: float}}.
+    top_k is clamped to 1..MAX_TOP_ZIPS; raises ValueError on malformed values.
+    """
+    if body is None:
+        body = {}
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+
+    def number(key):
+        value = body[key]
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} must be a number")
+        if not math.isfinite(value):
+            raise ValueError(f"{key} must be a finite number")
+        return value
+
+    bounds = {k: number(k) for k in TARGETING_BOUNDS if body.get(k) is not None}
+    top_k = GROWTH_TOP_ZIPS
+    if body.get("top_k") is not None:
+        top_k = number("top_k")
+        if top_k != int(top_k):
+            raise ValueError("top_k must be a whole number")
+    return {"top_k": max(1, min(int(top_k), MAX_TOP_ZIPS)), "bounds": bounds}
+
+def _get_demographic_data(criteria: dict, req_id: str) -> list[dict]:
+    """
+    Ranks the national ZIP table and returns the top rows.
+    `criteria` comes from _parse_criteria (JSON body: top_k, min_income, min_household_size, min_age, max_age, min_population).
+    """
+    if not DEMOGRAPHICS_PATH:
+        return _get_demographic_data_stub()
+
+    from demographics import get_table, select_target_zips  # numpy import only when a table is configured
+
+    table = get_table(DEMOGRAPHICS_PATH)
+    bounds = criteria["bounds"]
+    rows = select_target_zips(table, k=criteria["top_k"], **bounds)
+    log(f"Ranked {len(table)} ZIPs; selected {len(rows)} with {bounds or 'no filters'}.", request_id=req_id)
+    return rows
+
 def _get_demographic_data_stub():
     """Returns a stubbed list of demographic data for top ZIP codes."""
     return [
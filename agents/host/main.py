@@ -0,0 +1,83 @@
+"""
+Unified ASGI host: serves every Flask agent from one process.
+
+Each agent's `main.py` is loaded as-is and mounted under its own prefix through a
+WSGI adapter with a bounded thread pool, so a slow agent can only tie up its own
+threads. Agents share one copy of `shared`, and with it one process-wide GCS
+client, SendGrid client and LLM connection pool (each thread has its own
+requests.Session on top of the pool), plus the Google credentials and discovery
+documents. Docs/Drive/Sheets services are still built per request, since
+httplib2 connections can't be shared between threads.
+
+Env:
+- HOST_AGENTS: comma-separated agents to mount (default: aegis,architect,growth,oracle)
+- HOST_PREFIX_<AGENT>: route prefix, e.g. HOST_PREFIX_ORACLE="" to keep Oracle's webhooks at the root
+  (default: /<agent>). At most one agent may be mounted at the root.
+- HOST_THREADS_<AGENT>: threads for that agent's blocking work (default: HOST_THREADS, 8)
+- AGENTS_ROOT: directory holding the agent folders and `shared` (default: parent of this file)
+
+Run: uvicorn main:app --host 0.0.0.0 --port 8080  (or `python main.py`)
+"""
+import os
+import sys
+import importlib.util
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+AGENTS_ROOT = os.path.abspath(os.environ.get("AGENTS_ROOT", os.path.join(os.path.dirname(__file__), "..")))
+DEFAULT_AGENTS = "aegis,architect,growth,oracle"
+DEFAULT_THREADS = int(os.environ.get("HOST_THREADS", 8))
+
+
+def _load_agent(name: str):
+    """Import agents/<name>/main.py under a unique module name and return its Flask app."""
+    agent_dir = os.path.join(AGENTS_ROOT, name)
+    # Agents import `shared` and their own helper modules (e.g. `premiums`) as top-level modules.
+    for path in (AGENTS_ROOT, agent_dir):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(f"{name}_agent", os.path.join(agent_dir, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def _prefix(name: str) -> str:
+    prefix = os.environ.get(f"HOST_PREFIX_{name.upper()}", f"/{name}").rstrip("/")
+    if prefix and not prefix.startswith("/"):
+        prefix = "/" + prefix
+    return prefix
+
+
+def build_app(agent_names: list[str]) -> Starlette:
+    mounts = []
+    for name in agent_names:
+        threads = int(os.environ.get(f"HOST_THREADS_{name.upper()}", DEFAULT_THREADS))
+        mounts.append((_prefix(name), name, WSGIMiddleware(_load_agent(name), workers=threads)))
+        print(f"Mounted {name} at '{mounts[-1][0] or '/'}' ({threads} threads)")
+
+    roots = [name for prefix, name, _ in mounts if not prefix]
+    if len(roots) > 1:
+        raise ValueError(f"Only one agent can be mounted at the root; got {roots}")
+
+    agents = {name: prefix or "/" for prefix, name, _ in mounts}
+
+    async def healthz(request):
+        return JSONResponse({"status": "ok", "agents": agents})
+
+    # Longest prefix first so a root-mounted agent doesn't shadow the others.
+    routes = [Route("/healthz", healthz, methods=["GET"])]
+    routes += [Mount(prefix, app=wsgi) for prefix, _, wsgi in sorted(mounts, key=lambda m: -len(m[0]))]
+    return Starlette(routes=routes)
+
+
+app = build_app([a.strip() for a in os.environ.get("HOST_AGENTS", DEFAULT_AGENTS).split(",") if a.strip()])
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get("PORT", 8080))
+    uvicorn.run(app, host="0.0.0.0", port=port, proxy_headers=True, forwarded_allow_ips="*")
@@ -0,0 +1,180 @@
+"""
+Admission control for the chat API.
+
+- Token buckets per conversation and per client IP (`RateLimiter`).
+- A per-worker cap on in-flight LLM calls with a bounded wait queue (`ConcurrencyGate`).
+
+Bucket state lives in process memory by default. Point `make_bucket_store` at a
+SQLite file to share it between uvicorn workers on the same host.
+"""
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+
+class Overloaded(Exception):
+    """Raised when the LLM queue is full or a queued request waited too long."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Overloaded; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> tuple[float, float]:
+    """
+    Refill a bucket and try to take one token.
+    Returns (tokens_left, retry_after); retry_after is 0 when the token was granted.
+    """
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBucketStore:
+    """Per-process bucket state. Idle buckets are pruned once the table grows large."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens, retry_after = _refill(tokens, updated, now, rate, burst)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._prune(now)
+        return retry_after
+
+    def _prune(self, now: float, idle: float = 3600.0):
+        for k in [k for k, (_, updated) in self._buckets.items() if now - updated > idle]:
+            del self._buckets[k]
+
+
+class SqliteBucketStore:
+    """
+    Bucket state in a local SQLite file, shared by every worker process on the host.
+    Fails open (admits the request) if the database stays locked past the busy timeout,
+    so the limiter can never take the chat endpoint down with it.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 200):
+        self._path = path
+        self._busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._takes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, isolation_level=None, timeout=self._busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.time()  # wall clock: monotonic clocks aren't comparable across processes
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row else (burst, now)
+                tokens, retry_after = _refill(tokens, updated, now, rate, burst)
+                conn.execute(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (key, tokens, now),
+                )
+                self._takes += 1
+                if self._takes % 1000 == 0:
+                    conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 3600,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError as e:
+            print(f"Rate limit store unavailable ({e}); admitting request.")
+            return 0.0
+        return retry_after
+
+
+def make_bucket_store(path: Optional[str] = None):
+    """SQLite-backed store when a path is given, in-memory otherwise."""
+    return SqliteBucketStore(path) if path else MemoryBucketStore()
+
+
+class RateLimiter:
+    """Token bucket: `per_minute` sustained requests with bursts of up to `burst`."""
+
+    def __init__(self, store, name: str, per_minute: float, burst: int):
+        self.store = store
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = float(burst)
+
+    def check(self, key: str) -> int:
+        """Returns 0 when admitted, otherwise whole seconds to wait (for Retry-After)."""
+        if self.rate <= 0:
+            return 0
+        retry_after = self.store.take(f"{self.name}:{key}", self.rate, self.burst)
+        return math.ceil(retry_after) if retry_after > 0 else 0
+
+
+class ConcurrencyGate:
+    """
+    Caps in-flight work at `limit`. Up to `max_queue` requests may wait (for at most
+    `timeout` seconds); anything beyond that is rejected immediately with Overloaded.
+    """
+
+    def __init__(self, limit: int, max_queue: int, timeout: float, retry_after: int = 5):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._sem = asyncio.Semaphore(limit)
+        self._waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._sem.locked() and self._waiting >= self.max_queue:
+            raise Overloaded(self.retry_after)
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded(self.retry_after)
+        finally:
+            self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._sem.release()
+
+
+def client_ip(request, trusted_proxy_hops: int) -> Optional[str]:
+    """
+    Client address from X-Forwarded-For, counting `trusted_proxy_hops` entries from the
+    right (the ones added by proxies we trust); client-supplied entries to the left are ignored.
+    Returns None when no trusted hop is configured or the header is too short. Behind a
+    proxy the socket peer is the proxy itself, and keying on it would put every visitor
+    into one bucket, so callers should skip per-IP limiting instead.
+    """
+    if trusted_proxy_hops <= 0:
+        return None
+    forwarded = [p.strip() for p in request.headers.get("x-forwarded-for", "").split(",") if p.strip()]
+    if len(forwarded) < trusted_proxy_hops:
+        return None
+    return forwarded[-trusted_proxy_hops]
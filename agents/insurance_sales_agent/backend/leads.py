@@ -0,0 +1,327 @@
+"""
+Lead store: a local SQLite database in WAL mode, optionally mirrored to GCS.
+
+Leads are deduplicated by normalized email; repeat submissions update the
+existing row and bump its `submissions` count. Every insert or update gets a
+new `seq` (microseconds since the epoch, never lower than the lead's previous
+value), so exporting `seq > cursor` picks up new and changed leads.
+
+On Cloud Run each instance has its own SQLite file on ephemeral disk. With a
+GcsLeadMirror, every write is first merged into one GCS object per email (with
+a generation precondition, so concurrent instances never lose a submission),
+and exports pull changed objects into the local file before paging.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+
+# `id` is local to one database file, so it is not exported.
+EXPORT_COLUMNS = ["seq", "email", "name", "phone", "conversation_id", "submissions", "created_at", "updated_at"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seq INTEGER NOT NULL,
+    email TEXT NOT NULL,
+    name TEXT NOT NULL,
+    phone TEXT,
+    conversation_id TEXT NOT NULL,
+    submissions INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS leads_email ON leads (email);
+CREATE INDEX IF NOT EXISTS leads_seq ON leads (seq);
+CREATE INDEX IF NOT EXISTS leads_phone ON leads (phone);
+CREATE INDEX IF NOT EXISTS leads_conversation ON leads (conversation_id);
+"""
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Digits only, keeping a leading '+'. Empty input becomes None."""
+    if not phone:
+        return None
+    digits = re.sub(r"\D", "", phone)
+    if not digits:
+        return None
+    return ("+" if phone.strip().startswith("+") else "") + digits
+
+
+def merge_lead(current: Optional[dict], conversation_id: str, name: str, email: str, phone: Optional[str], min_seq: int = 0) -> dict:
+    """
+    The lead row after one more submission. `current` is the stored row (None for a new lead).
+    A missing phone never overwrites a known one.
+    """
+    now = datetime.now(timezone.utc)
+    stamp = now.isoformat(timespec="seconds")
+    seq = max(int(now.timestamp() * 1_000_000), min_seq, (current["seq"] + 1) if current else 0)
+    if current is None:
+        return {
+            "seq": seq, "email": email, "name": name, "phone": phone, "conversation_id": conversation_id,
+            "submissions": 1, "created_at": stamp, "updated_at": stamp,
+        }
+    return {
+        **current,
+        "seq": seq,
+        "name": name,
+        "phone": phone or current.get("phone"),
+        "conversation_id": conversation_id,
+        "submissions": current["submissions"] + 1,
+        "updated_at": stamp,
+    }
+
+
+class GcsLeadMirror:
+    """
+    Durable copy of every lead: one JSON object per normalized email under gs://<bucket>/<prefix>/.
+    Safe across instances: each write is a read-merge-write guarded by the object's generation.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "leads", max_attempts: int = 8, download_workers: int = 16):
+        from google.cloud import storage
+        self._bucket = storage.Client().bucket(bucket)
+        self.prefix = prefix.strip("/")
+        self.max_attempts = max_attempts
+        self.download_workers = download_workers
+
+    def _blob_name(self, email: str) -> str:
+        return f"{self.prefix}/{hashlib.sha256(email.encode()).hexdigest()}.json"
+
+    def merge(self, conversation_id: str, name: str, email: str, phone: Optional[str]) -> tuple[dict, bool]:
+        """Apply one submission to the stored record. Returns (record, created)."""
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+        blob_name = self._blob_name(email)
+        for attempt in range(self.max_attempts):
+            blob = self._bucket.get_blob(blob_name)
+            try:
+                current = json.loads(blob.download_as_bytes(if_generation_match=blob.generation)) if blob else None
+                record = merge_lead(current, conversation_id, name, email, phone)
+                self._bucket.blob(blob_name).upload_from_string(
+                    json.dumps(record), content_type="application/json",
+                    if_generation_match=blob.generation if blob else 0,
+                )
+                return record, current is None
+            except (NotFound, PreconditionFailed):
+                time.sleep(0.05 * (attempt + 1))  # another instance wrote this lead first; merge again
+        raise RuntimeError(f"Lead record for {email} kept changing; gave up after {self.max_attempts} attempts")
+
+    def changed_since(self, since: Optional[datetime]) -> Iterator[dict]:
+        """Records whose objects were updated after `since` (all of them when None), in no particular order."""
+        from google.api_core.exceptions import NotFound
+        blobs = [b for b in self._bucket.list_blobs(prefix=f"{self.prefix}/") if since is None or b.updated > since]
+
+        def download(blob):
+            try:
+                return json.loads(blob.download_as_bytes())
+            except NotFound:
+                return None  # deleted since the listing
+
+        with ThreadPoolExecutor(max_workers=self.download_workers) as pool:
+            for record in pool.map(download, blobs):
+                if record is not None:
+                    yield record
+
+
+def make_lead_mirror(bucket: Optional[str], prefix: str = "leads") -> Optional[GcsLeadMirror]:
+    """GCS mirror when a bucket is given, None (local database only) otherwise."""
+    return GcsLeadMirror(bucket, prefix) if bucket else None
+
+
+def on_mounted_volume(path: str) -> bool:
+    """True if `path` sits on a mount other than the container's root filesystem."""
+    current = os.path.dirname(os.path.abspath(path))
+    while current != os.path.dirname(current):
+        if os.path.ismount(current):
+            return True
+        current = os.path.dirname(current)
+    return False
+
+
+class LeadStore:
+    """
+    Thread-safe: each thread gets its own connection; writes serialize on SQLite's write lock.
+    With a `mirror`, the mirror is the source of truth and this database is a local copy for exports.
+    """
+
+    def __init__(self, path: str, mirror: Optional[GcsLeadMirror] = None, settle_seconds: float = 30.0, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.mirror = mirror
+        # Writers on other instances pick `seq` before their write lands; exports stop this far
+        # behind now so a late write never ends up below a cursor that was already handed out.
+        self.settle_seconds = settle_seconds if mirror else 0.0
+        self._busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._synced_at: Optional[datetime] = None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if mirror is None and not on_mounted_volume(path):
+            print(
+                "!" * 72 + "\n"
+                f"WARNING: lead database {os.path.abspath(path)} is not on a mounted volume\n"
+                "and no GCS mirror is configured. Leads will be lost when this instance\n"
+                "restarts, and duplicate detection only covers this instance.\n"
+                "Set LEADS_GCS_BUCKET to keep a durable copy.\n"
+                + "!" * 72,
+                flush=True,
+            )
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=self._busy_timeout_ms / 1000)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, conversation_id: str, name: str, email: str, phone: Optional[str] = None) -> dict:
+        """
+        Insert a lead or merge it into the existing row with the same email.
+        A missing phone never overwrites a known one.
+        Returns {"id", "created", "submissions"}; `id` is this database's row id.
+        """
+        email, phone = normalize_email(email), normalize_phone(phone)
+        if self.mirror is not None:
+            record, created = self.mirror.merge(conversation_id, name, email, phone)
+            return {"id": self.apply(record), "created": created, "submissions": record["submissions"]}
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM leads WHERE email = ?", (email,)).fetchone()
+            floor = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM leads").fetchone()[0]
+            record = merge_lead(dict(row) if row else None, conversation_id, name, email, phone, min_seq=floor)
+            lead_id = self._write(conn, record)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"id": lead_id, "created": row is None, "submissions": record["submissions"]}
+
+    def apply(self, record: dict) -> int:
+        """Store a record from the mirror unless the local row is already as new. Returns the row id."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            lead_id = self._write(conn, record)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return lead_id
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, record: dict) -> int:
+        conn.execute(
+            f"INSERT INTO leads ({', '.join(EXPORT_COLUMNS)}) VALUES ({', '.join('?' for _ in EXPORT_COLUMNS)}) "
+            "ON CONFLICT(email) DO UPDATE SET "
+            + ", ".join(f"{c} = excluded.{c}" for c in EXPORT_COLUMNS if c != "email")
+            + " WHERE excluded.seq > leads.seq",
+            [record.get(c) for c in EXPORT_COLUMNS],
+        )
+        return conn.execute("SELECT id FROM leads WHERE email = ?", (record["email"],)).fetchone()[0]
+
+    def sync(self) -> int:
+        """
+        Pull records changed in the mirror since the last sync (everything, the first time).
+        Returns how many records were applied; a no-op without a mirror.
+        """
+        if self.mirror is None:
+            return 0
+        with self._sync_lock:
+            started = datetime.now(timezone.utc)
+            # Re-read a settle window of overlap; applying a record twice is harmless.
+            since = self._synced_at - timedelta(seconds=self.settle_seconds) if self._synced_at else None
+            count = 0
+            for record in self.mirror.changed_since(since):
+                self.apply(record)
+                count += 1
+            self._synced_at = started
+            return count
+
+    def find(self, email: Optional[str] = None, phone: Optional[str] = None, conversation_id: Optional[str] = None) -> list[dict]:
+        """Look up leads by any indexed key."""
+        clauses, params = [], []
+        if email:
+            clauses.append("email = ?")
+            params.append(normalize_email(email))
+        if phone:
+            clauses.append("phone = ?")
+            params.append(normalize_phone(phone))
+        if conversation_id:
+            clauses.append("conversation_id = ?")
+            params.append(conversation_id)
+        if not clauses:
+            return []
+        sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM leads WHERE {' OR '.join(clauses)} ORDER BY seq"
+        return [dict(r) for r in self._conn().execute(sql, params)]
+
+    def page_end(self, cursor: int, limit: int) -> tuple[int, bool]:
+        """
+        Fix the bounds of an export page before streaming it.
+        Returns (last seq in the page, whether more rows follow). An empty page returns the cursor.
+        Rows sharing the last seq all land in this page, and rows newer than the settle window wait.
+        """
+        conn = self._conn()
+        ceiling = int((time.time() - self.settle_seconds) * 1_000_000) if self.settle_seconds else 2 ** 63 - 1
+        row = conn.execute(
+            "SELECT seq FROM leads WHERE seq > ? AND seq <= ? ORDER BY seq LIMIT 1 OFFSET ?", (cursor, ceiling, limit - 1)
+        ).fetchone()
+        if row is None:
+            last = conn.execute("SELECT MAX(seq) FROM leads WHERE seq > ? AND seq <= ?", (cursor, ceiling)).fetchone()[0]
+            return (last if last is not None else cursor), False
+        more = conn.execute("SELECT 1 FROM leads WHERE seq > ? AND seq <= ? LIMIT 1", (row["seq"], ceiling)).fetchone() is not None
+        return row["seq"], more
+
+    def iter_rows(self, after: int, through: int, chunk: int = 500) -> Iterator[dict]:
+        """
+        Yield leads with after < seq <= through, in (seq, id) order, fetching `chunk` rows per query.
+        Safe to drive from a threadpool: each chunk uses the current thread's connection.
+        """
+        sql = (
+            f"SELECT id, {', '.join(EXPORT_COLUMNS)} FROM leads "
+            "WHERE (seq, id) > (?, ?) AND seq <= ? ORDER BY seq, id LIMIT ?"
+        )
+        last_id = 2 ** 63 - 1  # first query: seq > after
+        while True:
+            rows = self._conn().execute(sql, (after, last_id, through, chunk)).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield {c: r[c] for c in EXPORT_COLUMNS}
+            after, last_id = rows[-1]["seq"], rows[-1]["id"]
+
+
+def export_ndjson(rows: Iterator[dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def export_csv(rows: Iterator[dict], batch: int = 500) -> Iterator[str]:
+    """CSV with a header row, flushed every `batch` rows."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % batch == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
@@ -1,13 +1,18 @@
 import os
+import hmac
 import requests
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, EmailStr, Field
 from dotenv import load_dotenv
 from typing import List, Optional
 import openai
 from shared.email import send_email
+from admission import ConcurrencyGate, Overloaded, RateLimiter, client_ip, make_bucket_store
+from leads import LeadStore, export_csv, export_ndjson, make_lead_mirror
 
 # --- FastAPI App Initialization ---
 app = FastAPI(
@@ -28,6 +33,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 # --- Pydantic Models for Data Validation ---
@@ -59,6 +65,46 @@ BACKNINE_URL = os.environ.get("BACKNINE_URL")
 EMAIL_RECEIVE = os.environ.get("EMAIL_RECEIVE")
 SENDGRID_API_KEY = os.environ.get("SENDGRID_API_KEY")
 
+# --- Lead Store ---
+# Local SQLite file per instance. In production set LEADS_GCS_BUCKET so every lead is also
+# merged into a durable, deduplicated copy that all instances share.
+LEADS_DB_PATH = os.environ.get("LEADS_DB_PATH", "data/leads.db")
+LEADS_GCS_BUCKET = os.environ.get("LEADS_GCS_BUCKET")
+LEADS_GCS_PREFIX = os.environ.get("LEADS_GCS_PREFIX", "leads")
+# Exports only return leads older than this, so writes still in flight elsewhere aren't skipped.
+LEAD_EXPORT_SETTLE_SECONDS = float(os.environ.get("LEAD_EXPORT_SETTLE_SECONDS", 30))
+# Bearer token required by GET /leads/export; the endpoint is disabled when unset.
+LEAD_EXPORT_TOKEN = os.environ.get("LEAD_EXPORT_TOKEN")
+LEAD_EXPORT_MAX_LIMIT = 10000
+
+lead_store = LeadStore(LEADS_DB_PATH, make_lead_mirror(LEADS_GCS_BUCKET, LEADS_GCS_PREFIX), LEAD_EXPORT_SETTLE_SECONDS)
+
+# --- Admission Control ---
+# Rates are per minute; set a rate to 0 to disable that limiter.
+CHAT_RATE_PER_CONVERSATION = float(os.environ.get("CHAT_RATE_PER_CONVERSATION", 10))
+CHAT_BURST_PER_CONVERSATION = int(os.environ.get("CHAT_BURST_PER_CONVERSATION", 5))
+CHAT_RATE_PER_IP = float(os.environ.get("CHAT_RATE_PER_IP", 30))
+CHAT_BURST_PER_IP = int(os.environ.get("CHAT_BURST_PER_IP", 15))
+# Total concurrent LLM calls the model backend can sustain, split across uvicorn workers.
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 4))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", 16))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", 20))
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+# Optional SQLite file so all workers on a host share limiter state.
+RATE_LIMIT_DB = os.environ.get("RATE_LIMIT_DB")
+# Number of trusted proxies appending to X-Forwarded-For (1 on Cloud Run).
+# The per-IP limiter only runs when this is set; 0 disables it.
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+
+bucket_store = make_bucket_store(RATE_LIMIT_DB)
+conversation_limiter = RateLimiter(bucket_store, "conv", CHAT_RATE_PER_CONVERSATION, CHAT_BURST_PER_CONVERSATION)
+ip_limiter = RateLimiter(bucket_store, "ip", CHAT_RATE_PER_IP, CHAT_BURST_PER_IP)
+llm_gate = ConcurrencyGate(
+    limit=max(1, LLM_MAX_CONCURRENCY // max(1, WEB_CONCURRENCY)),
+    max_queue=max(0, LLM_MAX_QUEUE // max(1, WEB_CONCURRENCY)),
+    timeout=LLM_QUEUE_TIMEOUT,
+)
+
 # --- System Prompt for the LLM ---
 SYSTEM_PROMPT = """
 You are an expert AI assistant for an insurance agency. Your primary goal is to educate visitors about life insurance and guide them to an instant-apply tool. You must be friendly, concise, and helpful.
@@ -72,13 +118,11 @@ RULES:
 """
 
 # --- Helper Functions ---
-def get_llm_response(message: str, history: list[dict]) -> dict:
+def match_intent(message: str, history: list[dict]) -> Optional[dict]:
     """
-    Gets a response from the configured LLM provider.
-    Returns a dictionary matching the ChatResponse structure.
+    Answers keyword intents (talk to a human, apply/quote) without calling the LLM.
+    Returns a dictionary matching the ChatResponse structure, or None if no intent matched.
     """
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}] + history + [{"role": "user", "content": message}]
-
     lower_message = message.lower()
     apply_intent = any(kw in lower_message for kw in ["apply", "quote", "price", "cost", "how much"])
     human_intent = any(kw in lower_message for kw in ["human", "person", "agent", "talk to someone"])
@@ -93,6 +137,16 @@ def get_llm_response(message: str, history: list[dict]) -> dict:
         else:
             return {"reply": "No problem. We also have another excellent tool you can try.", "next_actions": {"apply_url": BACKNINE_URL}}
 
+    return None
+
+
+def get_llm_response(message: str, history: list[dict]) -> dict:
+    """
+    Gets a response from the configured LLM provider.
+    Returns a dictionary matching the ChatResponse structure.
+    """
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}] + history + [{"role": "user", "content": message}]
+
     if AI_MODEL == "openai":
         client = openai.OpenAI(api_key=OPENAI_API_KEY)
         completion = client.chat.completions.create(model="gpt-4-turbo", messages=messages, temperature=0.7)
@@ -109,13 +163,40 @@ def get_llm_response(message: str, history: list[dict]) -> dict:
     return {"reply": content, "next_actions": {"apply_url": None}}
 
 
+def too_busy(status_code: int, retry_after: int, detail: str) -> HTTPException:
+    """429/503 with a Retry-After header so clients back off instead of retrying hot."""
+    return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+def admit_chat(ip: Optional[str], conversation_id: str) -> int:
+    """Seconds to wait before this message is allowed (0 = admitted)."""
+    return (ip_limiter.check(ip) if ip else 0) or conversation_limiter.check(conversation_id)
+
+
 # --- API Endpoints ---
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """Handles a new chat message from the user."""
+    ip = client_ip(http_request, TRUSTED_PROXY_HOPS)
+    if RATE_LIMIT_DB:
+        # SQLite transactions block (up to the busy timeout); keep them off the event loop.
+        retry_after = await run_in_threadpool(admit_chat, ip, request.conversation_id)
+    else:
+        retry_after = admit_chat(ip, request.conversation_id)
+    if retry_after:
+        raise too_busy(429, retry_after, "Too many messages. Please wait a moment and try again.")
+
     try:
-        response_data = get_llm_response(request.message, request.history)
+        response_data = match_intent(request.message, request.history)
+        if response_data is None:
+            # Only LLM calls are expensive; hold a slot for them and keep the event loop free.
+            async with llm_gate.slot():
+                response_data = await run_in_threadpool(get_llm_response, request.message, request.history)
         return ChatResponse(**response_data)
+    except Overloaded as e:
+        raise too_busy(503, e.retry_after, "The assistant is busy right now. Please try again shortly.")
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in /chat endpoint: {e}")
         raise HTTPException(status_code=500, detail="An internal error occurred.")
@@ -123,16 +204,52 @@ async def chat(request: ChatRequest):
 
 @app.post("/lead")
 async def capture_lead(request: LeadRequest):
-    """Captures lead info and sends it via email."""
+    """Stores the lead (deduplicated by email) and emails it the first time it is seen."""
     try:
-        subject = f"New Website Lead: {request.name}"
-        body = f"A new lead was captured via the website chatbot.\n\nConversation ID: {request.conversation_id}\nName: {request.name}\nEmail: {request.email}\nPhone: {request.phone or 'Not provided'}"
-        send_email(subject=subject, content=body, to_email=EMAIL_RECEIVE)
-        return {"status": "ok", "message": "Lead captured successfully."}
+        stored = await run_in_threadpool(lead_store.upsert, request.conversation_id, request.name, request.email, request.phone)
     except Exception as e:
         print(f"Error in /lead endpoint: {e}")
         raise HTTPException(status_code=500, detail="An internal error occurred.")
 
+    if stored["created"]:
+        try:
+            subject = f"New Website Lead: {request.name}"
+            body = f"A new lead was captured via the website chatbot.\n\nConversation ID: {request.conversation_id}\nName: {request.name}\nEmail: {request.email}\nPhone: {request.phone or 'Not provided'}"
+            await run_in_threadpool(send_email, subject=subject, content=body, to_email=EMAIL_RECEIVE)
+        except Exception as e:
+            # The lead is already stored; don't fail the visitor over a notification.
+            print(f"Error emailing lead {stored['id']}: {e}")
+    return {"status": "ok", "message": "Lead captured successfully."}
+
+
+@app.get("/leads/export")
+def export_leads(request: Request, format: str = "ndjson", cursor: int = 0, limit: int = 1000):
+    """
+    Streams leads changed after `cursor` (new or updated), oldest first.
+    Pass the returned X-Next-Cursor back as `cursor` to fetch the next page; X-Has-More says whether one exists.
+    """
+    if not LEAD_EXPORT_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found.")
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode(), LEAD_EXPORT_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Unauthorized.")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'.")
+    if cursor < 0 or not 1 <= limit <= LEAD_EXPORT_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"cursor must be >= 0 and limit between 1 and {LEAD_EXPORT_MAX_LIMIT}.")
+
+    # Pull leads written by other instances, then fix the page bounds up front
+    # so the cursor headers match the streamed rows.
+    lead_store.sync()
+    page_end, has_more = lead_store.page_end(cursor, limit)
+    rows = lead_store.iter_rows(cursor, page_end)
+    body, media_type = (export_csv(rows), "text/csv") if format == "csv" else (export_ndjson(rows), "application/x-ndjson")
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"X-Next-Cursor": str(page_end), "X-Has-More": "true" if has_more else "false"},
+    )
+
 @app.get("/")
 def read_root():
     return {"message": "Insurance Sales Agent API is running."}
@@ -172,6 +172,11 @@
         body: JSON.stringify({ conversation_id: convoId, message: userText })
       });
       const data = await res.json();
+      if (res.status === 429 || res.status === 503) {
+        // Rate limited or busy: show the server's message and leave the CTA as-is
+        addMsg("bot", data.detail || "We're a little busy right now. Please try again in a moment.");
+        return;
+      }
       addMsg("bot", data.reply || "…");
       // Apply URL priority (Ethos/BackNine) from backend
       if (data.next_actions && data.next_actions.apply_url) {
@@ -1,12 +1,20 @@
+import io
 import os
+import json
 import uuid
-from flask import Flask, request, jsonify
+import zipfile
+import threading
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, request, jsonify
 from shared.gcp import gcs_upload_and_sign, make_docs_client, make_drive_client
 from shared.email import send_email
+from shared.pipeline import Stage, run_stages, run_in_background
 
 app = Flask(__name__)
 
 # ---- App limits & CORS ----
+# Matches Cloud Run's 32 MiB HTTP/1 request limit, so it is also the real cap for a batch upload.
 app.config["MAX_CONTENT_LENGTH"] = 32 * 1024 * 1024  # 32 MB
 ALLOWED_ORIGIN = os.environ.get("ALLOWED_ORIGIN", "*")
 
@@ -17,6 +25,19 @@ def add_cors_headers(resp):
     resp.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
     return resp
 
+# ---- Batch limits ----
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 4))
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", 100))
+# Zip-bomb guard only: PDFs barely compress, so real archives never get near it.
+_MAX_UNZIPPED_BYTES = 4 * app.config["MAX_CONTENT_LENGTH"]
+
+# Shared across requests so concurrent batches can't multiply the worker count.
+_batch_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="oracle-batch")
+
+# PyMuPDF isn't thread-safe; only one thread may touch fitz at a time.
+# Uploads and Drive/Docs calls stay concurrent around it.
+_fitz_lock = threading.Lock()
+
 
 # ---- Helpers: Docs templating ----
 
@@ -61,15 +82,133 @@ def create_report_from_template(client_name: str, policy_snippet: str, file_url:
     return f"https://docs.google.com/document/d/{new_doc_id}/edit"
 
 
+# ---- Helpers: audit pipeline ----
+
+
+def _is_pdf(filename: str, content_type: str) -> bool:
+    return content_type == "application/pdf" or filename.lower().endswith(".pdf")
+
+
+def _is_zip(filename: str, content_type: str) -> bool:
+    return content_type in ("application/zip", "application/x-zip-compressed") or filename.lower().endswith(".zip")
+
+
+def extract_policy_text(file_bytes: bytes, filename: str, content_type: str) -> str:
+    """Returns the text of a PDF, or a placeholder for other file types."""
+    if not _is_pdf(filename, content_type):
+        return "[Non-PDF uploaded — OCR can be added later]"
+    with _fitz_lock:
+        import fitz  # PyMuPDF (lazy import for faster cold starts)
+        doc = fitz.open(stream=file_bytes, filetype="pdf")
+        try:
+            policy_text = "".join(p.get_text() for p in doc)
+        finally:
+            doc.close()
+    return policy_text
+
+
+def process_policy_file(file_bytes: bytes, filename: str, content_type: str, client_name: str) -> dict:
+    """
+    Runs one file through the audit stages. Upload and extraction are independent
+    and run concurrently; the report waits for both.
+    Returns: {filename, file_url, report_url, timings_ms}
+    """
+    stages = {
+        # Save original to GCS and get signed URL
+        "upload": Stage(lambda: gcs_upload_and_sign(file_bytes, filename, content_type)["signed_url"]),
+        # Extract text if PDF
+        "extract": Stage(lambda: (extract_policy_text(file_bytes, filename, content_type) or "").strip()[:2000]),
+        # Create Google Doc from template
+        "report": Stage(
+            lambda upload, extract: create_report_from_template(client_name, extract, upload),
+            deps=("upload", "extract"),
+        ),
+    }
+    results, timings = run_stages(stages)
+    return {
+        "filename": filename,
+        "file_url": results["upload"],
+        "report_url": results["report"],
+        "timings_ms": timings,
+    }
+
+
+def expand_uploads(uploads) -> list[tuple[str, str, bytes]]:
+    """
+    Reads uploaded files into (filename, content_type, bytes), unpacking ZIP archives.
+    Raises ValueError for more than BATCH_MAX_FILES files, an archive that inflates
+    suspiciously, or members that can't be read (encrypted, unsupported compression).
+    """
+    items, total = [], 0
+    for up in uploads:
+        filename = up.filename or "upload"
+        content_type = up.mimetype or "application/octet-stream"
+        data = up.read()
+        if not _is_zip(filename, content_type):
+            items.append((filename, content_type, data))
+            continue
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            for info in zf.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                    continue
+                total += info.file_size
+                if total > _MAX_UNZIPPED_BYTES:
+                    raise ValueError("Archive expands to more data than a batch allows")
+                if info.flag_bits & 0x1:
+                    raise ValueError(f"{name} is password-protected; upload an unencrypted archive")
+                member_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                try:
+                    member = zf.read(info)
+                except (RuntimeError, NotImplementedError) as e:
+                    raise ValueError(f"Could not unpack {name}: {e}") from e
+                items.append((os.path.basename(name), member_type, member))
+                if len(items) > BATCH_MAX_FILES:
+                    break
+        if len(items) > BATCH_MAX_FILES:
+            break
+    if len(items) > BATCH_MAX_FILES:
+        raise ValueError(f"Too many files (max {BATCH_MAX_FILES})")
+    return items
+
+
+def _audit_one(index: int, filename: str, content_type: str, file_bytes: bytes, client_name: str) -> dict:
+    """Batch worker: never raises, so one bad file doesn't sink the batch."""
+    try:
+        result = process_policy_file(file_bytes, filename, content_type, client_name)
+        return {"index": index, "status": "ok", **result}
+    except Exception as e:
+        print(f"ERROR (policy-audit batch) '{filename}':", e)
+        return {"index": index, "status": "error", "filename": filename, "error": "Processing failed"}
+
+
+def _send_batch_summary(client_name: str, client_email: str, results: list[dict]) -> bool:
+    ok = [r for r in results if r["status"] == "ok"]
+    failed = [r for r in results if r["status"] != "ok"]
+    lines = [f"Client: {client_name} <{client_email}>", f"Files: {len(results)} ({len(ok)} ok, {len(failed)} failed)", ""]
+    for r in sorted(results, key=lambda r: r["index"]):
+        if r["status"] == "ok":
+            lines.append(f"- {r['filename']}\n  File: {r['file_url']}\n  Report: {r['report_url']}")
+        else:
+            lines.append(f"- {r['filename']}: FAILED")
+    try:
+        send_email(
+            subject=f"New Policy Audit Batch: {client_name} ({len(ok)}/{len(results)})",
+            content="\n".join(lines),
+            to_email=os.environ.get("YOUR_EMAIL"),
+        )
+        return True
+    except Exception as e:
+        print("ERROR (policy-audit batch) summary email:", e)
+        return False
+
+
 # ---- MAIN ENDPOINTS ----
 @app.route("/webhook/policy-audit", methods=["POST", "OPTIONS"])
 def handle_policy_audit():
     if request.method == "OPTIONS":
         return ("", 204)
     try:
-        # Lazy import for faster cold starts
-        import fitz  # PyMuPDF
-
         # Logging
         print("Content-Type:", request.headers.get("Content-Type"))
         print("Form keys:", list(request.form.keys()))
@@ -89,29 +228,16 @@ def handle_policy_audit():
         size = len(file_bytes)
         print(f"Received '{filename}' ({content_type}), size={size} bytes for {client_name} <{client_email}>")
 
-        # 1) Save original to GCS and get signed URL
-        gcs_info = gcs_upload_and_sign(file_bytes, filename, content_type)
-        signed_url = gcs_info["signed_url"]
-
-        # 2) Extract text if PDF
-        if content_type == "application/pdf" or filename.lower().endswith(".pdf"):
-            doc = fitz.open(stream=file_bytes, filetype="pdf")
-            policy_text = "".join(p.get_text() for p in doc)
-            doc.close()
-        else:
-            policy_text = "[Non-PDF uploaded — OCR can be added later]"
-
-        snippet = (policy_text or "").strip()[:2000]
-
-        # 3) Create Google Doc from template
-        report_url = create_report_from_template(client_name, snippet, signed_url)
+        # 1-3) Upload + extract (concurrently), then draft report
+        result = process_policy_file(file_bytes, filename, content_type, client_name)
+        signed_url, report_url = result["file_url"], result["report_url"]
 
-        # 4) Email results
-        email_to = os.environ.get("YOUR_EMAIL")
-        send_email(
+        # 4) Email results after responding
+        run_in_background(
+            send_email,
             subject=f"New Policy Audit: {client_name}",
             content=f"Client: {client_name} <{client_email}>\nFile: {signed_url}\nReport: {report_url}",
-            to_email=email_to
+            to_email=os.environ.get("YOUR_EMAIL"),
         )
 
         return jsonify({
@@ -121,6 +247,7 @@ def handle_policy_audit():
             "client_email": client_email,
             "file_url": signed_url,
             "report_url": report_url,
+            "timings_ms": result["timings_ms"],
         }), 200
 
     except Exception as e:
@@ -128,20 +255,123 @@ def handle_policy_audit():
         return jsonify({"error": "Internal server error"}), 500
 
 
+@app.route("/webhook/policy-audit/batch", methods=["POST", "OPTIONS"])
+def handle_policy_audit_batch():
+    """
+    Accepts many files (repeat `policy-file`, `file` or `files`) and/or ZIP archives.
+    Streams one NDJSON line per file as it completes, then a final summary line.
+    """
+    if request.method == "OPTIONS":
+        return ("", 204)
+    try:
+        client_name = (request.form.get("name") or "").strip()
+        client_email = (request.form.get("email") or "").strip()
+        uploads = [f for key in ("policy-file", "file", "files") for f in request.files.getlist(key)]
+        if not uploads:
+            print("ERROR: No file parts found (expected 'policy-file', 'file' or 'files').")
+            return jsonify({"error": "No file uploaded"}), 400
+
+        # Read everything before streaming; the request body is gone once the response starts.
+        try:
+            items = expand_uploads(uploads)
+        except (ValueError, zipfile.BadZipFile) as e:
+            print("ERROR (policy-audit batch):", e)
+            return jsonify({"error": str(e)}), 400
+        if not items:
+            return jsonify({"error": "No files found in upload"}), 400
+        print(f"Batch of {len(items)} files for {client_name} <{client_email}>")
+
+        futures = [
+            _batch_pool.submit(_audit_one, i, filename, content_type, data, client_name)
+            for i, (filename, content_type, data) in enumerate(items)
+        ]
+    except Exception as e:
+        print("FATAL (policy-audit batch):", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+    def stream():
+        results = []
+        try:
+            yield json.dumps({"event": "accepted", "files": len(futures)}) + "\n"
+            for fut in as_completed(futures):
+                res = fut.result()
+                results.append(res)
+                yield json.dumps({"event": "result", **res}) + "\n"
+        except GeneratorExit:
+            # Client went away; let the batch finish so the summary email still goes out.
+            print("WARN (policy-audit batch): client disconnected; finishing batch before closing.")
+            _send_batch_summary(client_name, client_email, [f.result() for f in futures])
+            raise
+        emailed = _send_batch_summary(client_name, client_email, results)
+        ok = sum(1 for r in results if r["status"] == "ok")
+        yield json.dumps({
+            "event": "summary",
+            "status": "ok",
+            "files": len(results),
+            "succeeded": ok,
+            "failed": len(results) - ok,
+            "emailed": emailed,
+        }) + "\n"
+
+    return Response(stream(), mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
 @app.route("/webhook/budget-tool", methods=["POST", "OPTIONS"])
 def handle_budget_tool():
+    """
+    Form fields: name, budget (monthly $), age, optional term (years) and health (class).
+    Returns an affordable coverage range served from the in-memory rate table.
+    """
     if request.method == "OPTIONS":
         return ("", 204)
     try:
+        from premiums import DEFAULT_HEALTH_CLASS, DEFAULT_TERM, get_estimator
+
         client_name = (request.form.get("name") or "").strip()
         budget = (request.form.get("budget") or "").strip()
-        print(f"Budget tool from {client_name} | Budget: {budget}")
-        return jsonify({"status": "ok"}), 200
+        age = (request.form.get("age") or "").strip()
+        term = (request.form.get("term") or "").strip() or DEFAULT_TERM
+        health = (request.form.get("health") or "").strip().lower() or DEFAULT_HEALTH_CLASS
+        print(f"Budget tool from {client_name} | Budget: {budget} | Age: {age} | Term: {term} | Health: {health}")
+
+        if not age or not budget:
+            # Older form posts only send name + budget; keep acknowledging them.
+            return jsonify({"status": "ok", "estimate": None, "message": "Provide age and budget for a coverage estimate."}), 200
+
+        estimate = get_estimator().estimate(age, budget, term=term, health_class=health)
+        if "error" in estimate:
+            return jsonify({"error": estimate["error"]}), 400
+        return jsonify({"status": "ok", "estimate": estimate, "illustrative": True}), 200
     except Exception as e:
         print("FATAL (budget-tool):", e)
         return jsonify({"error": "Internal server error"}), 500
 
 
+@app.route("/webhook/budget-tool/batch", methods=["POST", "OPTIONS"])
+def handle_budget_tool_batch():
+    """
+    JSON body: {"prospects": [{age, budget, term?, health_class?}, ...]}; results keep input order.
+    Invalid rows (including non-objects) get a per-row `error`; the rest are still priced.
+    """
+    if request.method == "OPTIONS":
+        return ("", 204)
+    try:
+        from premiums import MAX_BATCH, get_estimator
+
+        body = request.get_json(silent=True)
+        prospects = body.get("prospects") if isinstance(body, dict) else None
+        if not isinstance(prospects, list):
+            return jsonify({"error": "Expected JSON body {\"prospects\": [...]}"}), 400
+        if len(prospects) > MAX_BATCH:
+            return jsonify({"error": f"At most {MAX_BATCH} prospects per batch"}), 400
+
+        results = get_estimator().estimate_batch(prospects)
+        return jsonify({"status": "ok", "results": results, "illustrative": True}), 200
+    except Exception as e:
+        print("FATAL (budget-tool batch):", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
     app.run(host="0.0.0.0", port=port, debug=True)
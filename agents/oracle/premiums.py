@@ -0,0 +1,230 @@
+"""
+In-process term life premium estimates for the budget tool.
+
+Monthly premiums are precomputed into one NumPy array indexed
+[age, term, health class, coverage], so lookups are pure array indexing with
+no network calls. Mapping a budget to coverage uses a per-cell premium curve
+that never decreases with coverage. Counting the grid points at or under the
+budget then gives the largest affordable face amount.
+
+The built-in table is an illustrative model, not carrier pricing. Load real
+rates with RATE_TABLE_PATH (an .npz with arrays ages, terms, health_classes,
+coverage and monthly_premium shaped [ages, terms, classes, coverage]).
+`ages` may be banded: each entry is the first age of its band, and an optional
+scalar `max_age` sets the oldest age quoted (default: the last entry).
+"""
+import os
+import math
+import functools
+import numpy as np
+
+HEALTH_CLASSES = ("preferred_plus", "preferred", "standard_plus", "standard")
+DEFAULT_TERM = 20
+DEFAULT_HEALTH_CLASS = "standard_plus"
+MAX_BATCH = 10_000
+
+# ---- Illustrative rate model ----
+_AGES = np.arange(18, 81)
+_TERMS = np.array([10, 15, 20, 25, 30])
+_COVERAGE = np.concatenate([np.arange(50_000, 1_000_000, 25_000), np.arange(1_000_000, 5_000_001, 250_000)])
+_CLASS_FACTORS = np.array([0.75, 0.9, 1.1, 1.35])
+_BAND_EDGES = np.array([250_000, 500_000, 1_000_000])  # volume discounts start at each edge
+_BAND_FACTORS = np.array([1.0, 0.9, 0.8, 0.75])
+_LOADING = 1.25
+_POLICY_FEE_ANNUAL = 60.0
+_MONTHLY_MODAL = 0.0875  # monthly premium as a fraction of annual
+
+
+def _illustrative_table() -> np.ndarray:
+    """Monthly premium [age, term, class, coverage] from a simple select-mortality curve."""
+    ages = _AGES[:, None].astype(np.float64)
+    years = np.arange(_TERMS.max())[None, :]
+    q = 0.00008 * np.exp(0.085 * (ages + years - 18))               # [age, year]
+    cum = np.cumsum(q, axis=1)
+    avg_q = cum[:, _TERMS - 1] / _TERMS                               # [age, term] level rate over the term
+    per_1000 = 1000 * avg_q * _LOADING + 0.15                         # + per-unit expense
+    band = _BAND_FACTORS[np.searchsorted(_BAND_EDGES, _COVERAGE, side="right")]
+    annual = (
+        per_1000[:, :, None, None]
+        * _CLASS_FACTORS[None, None, :, None]
+        * band[None, None, None, :]
+        * (_COVERAGE / 1000)[None, None, None, :]
+        + _POLICY_FEE_ANNUAL
+    )
+    return (annual * _MONTHLY_MODAL).astype(np.float32)
+
+
+class PremiumEstimator:
+    """Vectorized premium and coverage lookups over a precomputed table."""
+
+    def __init__(self, ages, terms, health_classes, coverage, monthly_premium, max_age=None):
+        self.ages = np.asarray(ages, dtype=np.int32)
+        self.terms = np.asarray(terms, dtype=np.int32)
+        self.health_classes = tuple(str(h) for h in health_classes)
+        self.coverage = np.asarray(coverage, dtype=np.int64)
+        self.monthly = np.asarray(monthly_premium, dtype=np.float32)
+        self.max_age = int(self.ages[-1] if max_age is None else max_age)
+        expected = (len(self.ages), len(self.terms), len(self.health_classes), len(self.coverage))
+        if self.monthly.shape != expected:
+            raise ValueError(f"monthly_premium shape {self.monthly.shape} != {expected}")
+        if np.any(np.diff(self.ages) <= 0) or self.max_age < self.ages[-1]:
+            raise ValueError("ages must be strictly increasing band starts, with max_age >= the last band")
+        if np.any(self.terms <= 0) or len(set(self.terms.tolist())) != len(self.terms):
+            raise ValueError("terms must be unique positive years")
+        if np.any(np.diff(self.coverage) <= 0):
+            raise ValueError("coverage must be strictly increasing")
+        # Cheapest way to get at least this much coverage: if a bigger policy costs less
+        # (volume discounts), it caps the price. Makes each curve non-decreasing.
+        self.curve = np.minimum.accumulate(self.monthly[..., ::-1], axis=-1)[..., ::-1]
+        self._class_index = {h: i for i, h in enumerate(self.health_classes)}
+        self._term_set = set(self.terms.tolist())
+        self._term_index = np.full(self.terms.max() + 1, -1, dtype=np.int32)
+        self._term_index[self.terms] = np.arange(len(self.terms))
+
+    @classmethod
+    def illustrative(cls) -> "PremiumEstimator":
+        return cls(_AGES, _TERMS, HEALTH_CLASSES, _COVERAGE, _illustrative_table())
+
+    @classmethod
+    def from_npz(cls, path: str) -> "PremiumEstimator":
+        data = np.load(path, allow_pickle=False)
+        max_age = int(data["max_age"]) if "max_age" in data.files else None
+        return cls(data["ages"], data["terms"], data["health_classes"], data["coverage"], data["monthly_premium"], max_age)
+
+    # ---- Index helpers ----
+    def _indices(self, ages, terms, classes) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Array indices for each input plus a mask of rows that are inside the table."""
+        # float64 so out-of-range or fractional inputs are masked, not overflowed or truncated
+        ages = np.asarray(ages, dtype=np.float64)
+        terms = np.asarray(terms, dtype=np.float64)
+        valid_age = (ages >= self.ages[0]) & (ages <= self.max_age) & (ages == np.floor(ages))
+        a = np.searchsorted(self.ages, np.where(valid_age, ages, self.ages[0]), side="right") - 1  # band lookup
+        valid_term = (terms > 0) & (terms < len(self._term_index)) & (terms == np.floor(terms))
+        t = self._term_index[np.where(valid_term, terms, 0).astype(np.int64)]
+        h = np.asarray(
+            [self._class_index.get(c, -1) if isinstance(c, str) else -1 for c in np.atleast_1d(classes)],
+            dtype=np.int64,
+        ).reshape(np.shape(classes))
+        valid = valid_age & valid_term & (t >= 0) & (h >= 0)
+        return np.where(valid, a, 0), np.where(valid, t, 0), np.where(valid, h, 0), valid
+
+    # ---- Vectorized lookups ----
+    def monthly_premium(self, ages, terms, classes, coverages) -> np.ndarray:
+        """Monthly premium for each row, pricing coverage at the next grid point up. NaN where out of range."""
+        a, t, h, valid = self._indices(ages, terms, classes)
+        coverages = np.asarray(coverages, dtype=np.int64)
+        c = np.searchsorted(self.coverage, coverages, side="left")
+        valid &= (coverages > 0) & (c < len(self.coverage))
+        premium = self.curve[a, t, h, np.where(valid, c, 0)]
+        return np.where(valid, premium, np.nan)
+
+    def max_coverage(self, ages, budgets, terms, classes) -> np.ndarray:
+        """Largest grid coverage whose monthly premium fits the budget; 0 if none does, -1 if out of range."""
+        a, t, h, valid = self._indices(ages, terms, classes)
+        budgets = np.asarray(budgets, dtype=np.float32)
+        curves = self.curve[a, t, h]                                   # [..., coverage]
+        count = (curves <= budgets[..., None]).sum(axis=-1)            # curves are non-decreasing
+        coverage = np.where(count > 0, self.coverage[np.maximum(count - 1, 0)], 0)
+        return np.where(valid, coverage, -1)
+
+    def coverage_range(self, ages, budgets, terms) -> tuple[np.ndarray, np.ndarray]:
+        """(low, high) affordable coverage across health classes: worst class to best class."""
+        ages, budgets, terms = np.broadcast_arrays(np.asarray(ages), np.asarray(budgets), np.asarray(terms))
+        best = np.full(ages.shape, self.health_classes[0], dtype=object)
+        worst = np.full(ages.shape, self.health_classes[-1], dtype=object)
+        return self.max_coverage(ages, budgets, terms, worst), self.max_coverage(ages, budgets, terms, best)
+
+    # ---- Request-level API ----
+    def validate_prospect(self, p) -> tuple[int, float, int, str] | str:
+        """Returns (age, budget, term, health_class), or an error message for this row."""
+        if not isinstance(p, dict):
+            return "prospect must be an object"
+        age = _as_whole(p.get("age"))
+        if age is None:
+            return "age must be a whole number"
+        if not self.ages[0] <= age <= self.max_age:
+            return f"age must be between {self.ages[0]} and {self.max_age}"
+        budget = _as_number(p.get("budget"))
+        if budget is None or budget <= 0:
+            return "budget must be a positive monthly amount"
+        term = _as_whole(p.get("term"), DEFAULT_TERM)
+        if term is None or term not in self._term_set:
+            return f"term must be one of {self.terms.tolist()}"
+        health_class = p.get("health_class") or DEFAULT_HEALTH_CLASS
+        if not isinstance(health_class, str) or health_class not in self._class_index:
+            return f"health_class must be one of {list(self.health_classes)}"
+        return age, budget, term, health_class
+
+    def estimate_batch(self, prospects: list[dict]) -> list[dict]:
+        """
+        Score many prospects at once. Each prospect: {age, budget (monthly $), term?, health_class?}.
+        Rows are validated one by one first; invalid rows come back with an `error`
+        and the valid ones are priced together.
+        """
+        if len(prospects) > MAX_BATCH:
+            raise ValueError(f"At most {MAX_BATCH} prospects per batch")
+        checked = [self.validate_prospect(p) for p in prospects]
+        valid = [row for row in checked if not isinstance(row, str)]
+        results = [{"error": row} if isinstance(row, str) else None for row in checked]
+        if not valid:
+            return results
+
+        ages = np.array([row[0] for row in valid], dtype=np.int64)
+        budgets = np.array([row[1] for row in valid], dtype=np.float32)
+        terms = np.array([row[2] for row in valid], dtype=np.int64)
+        classes = np.array([row[3] for row in valid], dtype=object)
+
+        likely = self.max_coverage(ages, budgets, terms, classes)
+        low, high = self.coverage_range(ages, budgets, terms)
+        premium = self.monthly_premium(ages, terms, classes, np.where(likely > 0, likely, self.coverage[0]))
+        a, t, h, _ = self._indices(ages, terms, classes)
+        minimum = self.curve[a, t, h, 0]
+
+        estimates = iter(zip(valid, low.tolist(), high.tolist(), likely.tolist(), premium.tolist(), minimum.tolist()))
+        for i, result in enumerate(results):
+            if result is not None:
+                continue
+            (age, budget, term, health_class), lo, hi, best, prem, floor = next(estimates)
+            results[i] = {
+                "age": age,
+                "term": term,
+                "health_class": health_class,
+                "monthly_budget": round(budget, 2),
+                "coverage_low": lo,
+                "coverage_high": hi,
+                "coverage_likely": best,
+                "monthly_premium": round(prem, 2) if best > 0 else None,
+                "minimum_monthly_premium": round(floor, 2),
+            }
+        return results
+
+    def estimate(self, age, budget, term=DEFAULT_TERM, health_class=DEFAULT_HEALTH_CLASS) -> dict:
+        return self.estimate_batch([{"age": age, "budget": budget, "term": term, "health_class": health_class}])[0]
+
+
+def _as_number(value, default=None):
+    """Form/JSON values to a finite float; '$1,200' works. Missing -> default, unparseable -> None."""
+    if value is None or value == "" or isinstance(value, bool):
+        return default
+    if not isinstance(value, (int, float, str)):
+        return None
+    try:
+        number = float(str(value).replace("$", "").replace(",", "").strip())
+    except (ValueError, OverflowError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _as_whole(value, default=None):
+    """Like _as_number, but only whole numbers ('35', 35, 35.0) are accepted; 20.7 is rejected."""
+    number = _as_number(value, default)
+    if number is None or number != int(number):
+        return None
+    return int(number)
+
+
+@functools.lru_cache(maxsize=1)
+def get_estimator() -> PremiumEstimator:
+    """Built once per process (lazily, to keep numpy off the cold-start path of other routes)."""
+    path = os.environ.get("RATE_TABLE_PATH")
+    return PremiumEstimator.from_npz(path) if path else PremiumEstimator.illustrative()
@@ -1,5 +1,7 @@
 from .utils import log, with_retries, new_request_id
 from .gcp import gcs_upload_and_sign, make_docs_client, make_drive_client, make_sheets_client
 from .email import send_email
-from .llm import draft_text
+from .llm import draft_text, generate
+from .structured import draft_structured, structured_stats, new_run_stats, StructuredOutputError
 from .backnine import get_backnine_quote  # may be a stub
+from .pipeline import Stage, run_stages, run_in_background
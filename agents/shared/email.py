@@ -1,12 +1,17 @@
-import os
+import os, functools
 from .utils import with_retries
 
+# One client per API key for the whole process; each send opens its own request.
+@functools.lru_cache(maxsize=4)
+def _sendgrid_client(api_key: str):
+    from sendgrid import SendGridAPIClient
+    return SendGridAPIClient(api_key)
+
 @with_retries()
 def send_email(subject: str, content: str, to_email: str | None = None):
     """
     Send a plaintext email via SendGrid. Uses env: SENDGRID_API_KEY and YOUR_EMAIL (as from/to default).
     """
-    from sendgrid import SendGridAPIClient
     from sendgrid.helpers.mail import Mail
     sg_key = os.environ.get("SENDGRID_API_KEY")
     default_to = os.environ.get("YOUR_EMAIL")
@@ -19,4 +24,4 @@ def send_email(subject: str, content: str, to_email: str | None = None):
         subject=subject,
         plain_text_content=content,
     )
-    SendGridAPIClient(sg_key).send(msg)
+    _sendgrid_client(sg_key).send(msg)
@@ -1,6 +1,6 @@
-import os, uuid
+import os, uuid, functools
 from datetime import timedelta
-from .utils import with_retries
+from .utils import with_retries, process_singleton
 
 @with_retries()
 def gcs_upload_and_sign(file_bytes: bytes, filename: str, content_type: str, prefix_env: str = "GCS_UPLOAD_PREFIX") -> dict:
@@ -8,33 +8,47 @@ def gcs_upload_and_sign(file_bytes: bytes, filename: str, content_type: str, pre
     Upload bytes to GCS and return {gs_path, signed_url}. Signed URL valid 7 days.
     Requires env: GCS_BUCKET_NAME, optional GCS_UPLOAD_PREFIX.
     """
-    from google.cloud import storage
     bucket_name = os.environ["GCS_BUCKET_NAME"]
     folder = os.environ.get(prefix_env, "uploads")
-    storage_client = storage.Client()
+    storage_client = make_storage_client()
     blob_name = f"{folder}/{uuid.uuid4()}_{filename or 'upload'}"
     blob = storage_client.bucket(bucket_name).blob(blob_name)
     blob.upload_from_string(file_bytes, content_type=content_type)
     url = blob.generate_signed_url(expiration=timedelta(days=7), method="GET")
     return {"gs_path": f"gs://{bucket_name}/{blob_name}", "signed_url": url}
 
-def make_docs_client():
+# storage.Client is thread-safe: one per process.
+@process_singleton
+def make_storage_client():
+    from google.cloud import storage
+    return storage.Client()
+
+# googleapiclient services sit on httplib2, which isn't thread-safe. Credentials and
+# discovery documents are loaded once per process; each call returns a new service on
+# its own AuthorizedHttp. Build one per request and don't hand it to other threads.
+@functools.lru_cache(maxsize=None)
+def _credentials(scope: str):
     import google.auth
-    from googleapiclient.discovery import build
-    scopes = ["https://www.googleapis.com/auth/documents"]
-    creds, _ = google.auth.default(scopes=scopes)
-    return build("docs", "v1", credentials=creds)
+    creds, _ = google.auth.default(scopes=[scope])
+    return creds
+
+@functools.lru_cache(maxsize=None)
+def _discovery_doc(name: str, version: str) -> str:
+    from googleapiclient.discovery_cache import get_static_doc
+    return get_static_doc(name, version)
+
+def _build_service(name: str, version: str, scope: str):
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build_from_document
+    http = AuthorizedHttp(_credentials(scope), http=httplib2.Http())
+    return build_from_document(_discovery_doc(name, version), http=http)
+
+def make_docs_client():
+    return _build_service("docs", "v1", "https://www.googleapis.com/auth/documents")
 
 def make_drive_client():
-    import google.auth
-    from googleapiclient.discovery import build
-    scopes = ["https://www.googleapis.com/auth/drive"]
-    creds, _ = google.auth.default(scopes=scopes)
-    return build("drive", "v3", credentials=creds)
+    return _build_service("drive", "v3", "https://www.googleapis.com/auth/drive")
 
 def make_sheets_client():
-    import google.auth
-    from googleapiclient.discovery import build
-    scopes = ["https://www.googleapis.com/auth/spreadsheets"]
-    creds, _ = google.auth.default(scopes=scopes)
-    return build("sheets", "v4", credentials=creds)
+    return _build_service("sheets", "v4", "https://www.googleapis.com/auth/spreadsheets")
@@ -1,4 +1,26 @@
-import os, requests
+import os, threading, requests
+from requests.adapters import HTTPAdapter
+from .utils import process_singleton
+
+_local = threading.local()
+
+@process_singleton
+def _adapter() -> HTTPAdapter:
+    """One keep-alive pool to the LLM host for the whole process (LLM_POOL_SIZE connections, default 16)."""
+    return HTTPAdapter(pool_connections=4, pool_maxsize=int(os.environ.get("LLM_POOL_SIZE", 16)))
+
+def _session() -> requests.Session:
+    """
+    requests.Session isn't documented as thread-safe, so each thread gets its own.
+    They all mount the shared adapter, whose urllib3 pool is thread-safe.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("http://", _adapter())
+        session.mount("https://", _adapter())
+        _local.session = session
+    return session
 
 def draft_text(prompt: str, system: str | None = None) -> str:
     """
@@ -6,19 +28,31 @@ def draft_text(prompt: str, system: str | None = None) -> str:
     - If LLM_PROVIDER=ollama (default): call Ollama (local/private) using llama3.
     - If LLM_PROVIDER=vertex: TODO (stub) call Vertex AI text models.
     """
+    return generate(prompt, system)["text"]
+
+def generate(prompt: str, system: str | None = None, format: str | dict | None = None) -> dict:
+    """
+    Like draft_text, but returns {"text", "tokens"} and accepts an Ollama `format`
+    ("json" or a JSON schema) for constrained decoding. Providers without
+    constrained decoding ignore `format`.
+    """
     provider = os.environ.get("LLM_PROVIDER", "ollama").lower()
     if provider == "vertex":
         # Stub to keep shared layer simple; implement when needed.
-        return _vertex_stub(prompt, system)
-    return _ollama(prompt, system)
+        return {"text": _vertex_stub(prompt, system), "tokens": 0}
+    return _ollama(prompt, system, format)
 
-def _ollama(prompt: str, system: str | None):
+def _ollama(prompt: str, system: str | None, format: str | dict | None = None) -> dict:
     host = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
-    payload = {"model": "llama3", "prompt": f"{system+'\n' if system else ''}{prompt}", "stream": False}
-    r = requests.post(f"{host}/api/generate", json=payload, timeout=120)
+    prefix = f"{system}\n" if system else ""
+    payload = {"model": "llama3", "prompt": f"{prefix}{prompt}", "stream": False}
+    if format is not None:
+        payload["format"] = format
+    r = _session().post(f"{host}/api/generate", json=payload, timeout=120)
     r.raise_for_status()
     data = r.json()
-    return data.get("response", "").strip()
+    tokens = int(data.get("prompt_eval_count") or 0) + int(data.get("eval_count") or 0)
+    return {"text": data.get("response", "").strip(), "tokens": tokens}
 
 def _vertex_stub(prompt: str, system: str | None):
     return f"[vertex-stub]\nSYSTEM:\n{system or ''}\nPROMPT:\n{prompt[:2000]}"
@@ -0,0 +1,69 @@
+import os, time, typing as t
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .utils import log
+
+# Stage work runs here. Stages are leaves (they never wait on other stages),
+# so callers that are themselves pool workers can't deadlock this pool.
+_stage_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("STAGE_WORKERS", 8)), thread_name_prefix="stage")
+# Post-response work (emails, notifications) that must not hold up a reply.
+_background_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("BACKGROUND_WORKERS", 2)), thread_name_prefix="background")
+
+class Stage(t.NamedTuple):
+    fn: t.Callable[..., t.Any]
+    deps: tuple[str, ...] = ()
+
+def run_stages(stages: dict[str, Stage], request_id: str | None = None) -> tuple[dict[str, t.Any], dict[str, float]]:
+    """
+    Run a dependency graph of stages, starting each one as soon as its deps finish.
+    A stage's fn is called with its deps' results as keyword arguments.
+    Returns (results, timings_ms); timings include a "total" entry.
+    The first stage failure cancels stages not yet started and is re-raised.
+    """
+    for name, stage in stages.items():
+        missing = [d for d in stage.deps if d not in stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {missing}")
+
+    results: dict[str, t.Any] = {}
+    timings: dict[str, float] = {}
+    pending = dict(stages)
+    running = {}
+    started = time.perf_counter()
+
+    def timed(name: str, stage: Stage, kwargs: dict):
+        t0 = time.perf_counter()
+        try:
+            return stage.fn(**kwargs)
+        finally:
+            timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+
+    while pending or running:
+        for name in [n for n, s in pending.items() if all(d in results for d in s.deps)]:
+            stage = pending.pop(name)
+            kwargs = {d: results[d] for d in stage.deps}
+            running[_stage_pool.submit(timed, name, stage, kwargs)] = name
+        if not running:
+            raise ValueError(f"Stage dependency cycle among: {sorted(pending)}")
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for fut in done:
+            name = running.pop(fut)
+            try:
+                results[name] = fut.result()
+            except Exception:
+                for other in running:
+                    other.cancel()
+                log(f"Stage '{name}' failed after {timings.get(name)} ms", request_id=request_id)
+                raise
+
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    log("Stage timings (ms):", timings, request_id=request_id)
+    return results, timings
+
+def run_in_background(fn: t.Callable[..., t.Any], *args, request_id: str | None = None, **kwargs):
+    """Fire-and-forget on the shared background pool; failures are logged, not raised."""
+    def task():
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            log(f"Background task {getattr(fn, '__name__', fn)} failed: {e}", request_id=request_id)
+    return _background_pool.submit(task)
@@ -0,0 +1,128 @@
+import json, threading
+from .llm import generate
+from .utils import log
+
+class StructuredOutputError(ValueError):
+    """Raised when the LLM can't produce a schema-valid object within the repair budget."""
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "first_pass_valid": 0, "repairs": 0, "failures": 0, "tokens": 0, "retry_tokens": 0}
+
+def new_run_stats() -> dict:
+    """Zeroed counters for one run; pass to draft_structured(stats=...) to count only that run's calls."""
+    return dict.fromkeys(_stats, 0)
+
+def structured_stats(counters: dict | None = None) -> dict:
+    """Snapshot of `counters` (default: the process-wide ones), plus the first-pass validity rate."""
+    if counters is None:
+        with _stats_lock:
+            counters = dict(_stats)
+    snap = dict(counters)
+    snap["first_pass_valid_rate"] = round(snap["first_pass_valid"] / snap["requests"], 3) if snap["requests"] else None
+    return snap
+
+def _count(run_stats: dict | None, **deltas):
+    with _stats_lock:
+        for k, v in deltas.items():
+            _stats[k] += v
+    if run_stats is not None:
+        for k, v in deltas.items():
+            run_stats[k] = run_stats.get(k, 0) + v
+
+def parse_json_object(text: str) -> dict | None:
+    """Parse a JSON object from LLM output, tolerating code fences and surrounding prose."""
+    text = (text or "").strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        obj = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+_TYPES = {"object": dict, "array": list, "string": str, "boolean": bool, "integer": int, "number": (int, float)}
+
+def _check(value, schema: dict, path: str) -> str | None:
+    """Validate against a small JSON-schema subset. Returns the first problem found, or None."""
+    kind = schema.get("type")
+    if kind and (not isinstance(value, _TYPES[kind]) or (kind in ("integer", "number") and isinstance(value, bool))):
+        return f"{path} must be of type {kind}"
+    if kind == "string":
+        if len(value.strip()) < schema.get("minLength", 0):
+            return f"{path} must be at least {schema['minLength']} characters"
+    elif kind == "array":
+        if len(value) < schema.get("minItems", 0):
+            return f"{path} must have at least {schema['minItems']} items"
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            return f"{path} must have at most {schema['maxItems']} items"
+        for i, item in enumerate(value):
+            problem = "items" in schema and _check(item, schema["items"], f"{path}[{i}]")
+            if problem:
+                return problem
+    elif kind == "object":
+        for key in schema.get("required", []):
+            if key not in value:
+                return f"{path}.{key} is required"
+        for key, sub in schema.get("properties", {}).items():
+            problem = key in value and _check(value[key], sub, f"{path}.{key}")
+            if problem:
+                return problem
+    return None
+
+def validate_fields(obj: dict | None, schema: dict) -> dict[str, str]:
+    """Validate each top-level property of an object schema. Returns {field: problem} for failing fields."""
+    obj = obj or {}
+    problems = {}
+    for key, sub in schema.get("properties", {}).items():
+        if key not in obj:
+            if key in schema.get("required", []):
+                problems[key] = f"{key} is required"
+            continue
+        problem = _check(obj[key], sub, key)
+        if problem:
+            problems[key] = problem
+    return problems
+
+def _subschema(schema: dict, fields) -> dict:
+    return {
+        "type": "object",
+        "properties": {k: schema["properties"][k] for k in fields},
+        "required": list(fields),
+    }
+
+def draft_structured(prompt: str, schema: dict, system: str | None = None, max_repairs: int = 2, request_id: str | None = None, stats: dict | None = None) -> dict:
+    """
+    Ask the LLM for a JSON object matching `schema` (an object schema), using
+    constrained decoding where the provider supports it. Invalid fields are
+    re-requested on their own instead of regenerating the whole object.
+    Counts go to the process-wide counters and, if given, to `stats` (see new_run_stats).
+    Raises StructuredOutputError if fields are still invalid after `max_repairs` rounds.
+    """
+    first = generate(prompt, system, format=schema)
+    obj = parse_json_object(first["text"]) or {}
+    problems = validate_fields(obj, schema)
+    _count(stats, requests=1, tokens=first["tokens"], first_pass_valid=0 if problems else 1)
+
+    for attempt in range(max_repairs):
+        if not problems:
+            break
+        log(f"Structured output invalid ({attempt + 1}/{max_repairs}): {problems}", request_id=request_id)
+        sub = _subschema(schema, problems)
+        repair_prompt = (
+            f"{prompt}\n\n"
+            f"A previous answer had these problems:\n"
+            + "\n".join(f"- {p}" for p in problems.values())
+            + f"\n\nReturn ONLY a JSON object with exactly these keys: {', '.join(problems)}. "
+            f"It must satisfy this JSON schema:\n{json.dumps(sub)}"
+        )
+        retry = generate(repair_prompt, system, format=sub)
+        _count(stats, repairs=1, tokens=retry["tokens"], retry_tokens=retry["tokens"])
+        patch = parse_json_object(retry["text"]) or {}
+        obj.update({k: patch[k] for k in problems if k in patch})
+        problems = validate_fields(obj, schema)
+
+    if problems:
+        _count(stats, failures=1)
+        raise StructuredOutputError(f"LLM output failed schema validation: {problems}")
+    return {k: obj[k] for k in schema.get("properties", {}) if k in obj}
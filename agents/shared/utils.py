@@ -1,4 +1,4 @@
-import os, time, uuid, functools, typing as t
+import os, time, uuid, functools, threading, typing as t
 
 def new_request_id() -> str:
     return uuid.uuid4().hex[:12]
@@ -25,3 +25,20 @@ def with_retries(tries: int = 3, delay: float = 0.8, backoff: float = 2.0, excep
                     wait *= backoff
         return wrapper
     return deco
+
+def process_singleton(fn):
+    """
+    Build a zero-arg client factory's result once per process, on first use, and
+    hand the same object to every thread. Only for clients that are thread-safe.
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(fn)
+    def wrapper():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(fn())
+        return instance[0]
+    return wrapper